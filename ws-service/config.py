@@ -29,6 +29,10 @@ class Settings(BaseSettings):
     log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
     log_format: Literal["json", "text"] = "text"
 
+    # Session Configuration
+    # Seconds without a received frame before a session is evicted; 0 disables
+    session_pool_max_idle: float = 300.0
+
     # Environment
     environment: Literal["development", "staging", "production"] = "development"
 
@@ -1,6 +1,9 @@
 """Connection manager for WebSocket session tracking."""
 
+import asyncio
 import logging
+import time
+from collections.abc import Mapping
 from dataclasses import dataclass, field
 from typing import Any
 from uuid import uuid7
@@ -9,8 +12,11 @@ from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of WebSocket close handshakes in flight at once
+CLOSE_CONCURRENCY = 256
 
-@dataclass
+
+@dataclass(slots=True)
 class Session:
     """Represents an active WebSocket session."""
 
@@ -18,28 +24,43 @@ class Session:
     websocket: WebSocket
     client_host: str
     client_port: int
-    headers: dict[str, str] = field(default_factory=dict)
-    query_params: dict[str, str] = field(default_factory=dict)
-    metadata: dict[str, Any] = field(default_factory=dict)
+    # Any Mapping, so Starlette's Headers/QueryParams can be stored uncopied
+    headers: Mapping[str, str] = field(default_factory=dict)
+    query_params: Mapping[str, str] = field(default_factory=dict)
+    # Allocated on first update_metadata() call; most sessions never set any
+    metadata: dict[str, Any] | None = None
+    # time.monotonic() of the last frame received, used for idle eviction
+    last_active: float = field(default_factory=time.monotonic)
+
+    def touch(self) -> None:
+        """Record activity on the session."""
+        self.last_active = time.monotonic()
 
 
 class ConnectionManager:
     """Manages active WebSocket connections."""
 
+    # WebSocket close code 1001 ("going away") sent to clients on shutdown
+    SHUTDOWN_CODE = 1001
+    # WebSocket close code 1000 ("normal closure") sent to evicted idle sessions
+    IDLE_CODE = 1000
+
     def __init__(self):
         self._sessions: dict[str, Session] = {}
         self._is_shutting_down: bool = False
+        self._connections_total: int = 0
+        self._evictions: int = 0
 
     def connect(
         self,
         websocket: WebSocket,
         client_host: str,
         client_port: int,
-        headers: dict[str, str] | None = None,
-        query_params: dict[str, str] | None = None,
-    ) -> str:
-        """Register a new connection and return the session ID."""
-        session_id = str(uuid7())
+        headers: Mapping[str, str] | None = None,
+        query_params: Mapping[str, str] | None = None,
+    ) -> Session:
+        """Register a new connection and return its session."""
+        session_id = uuid7().hex
         session = Session(
             session_id=session_id,
             websocket=websocket,
@@ -49,6 +70,7 @@ class ConnectionManager:
             query_params=query_params or {},
         )
         self._sessions[session_id] = session
+        self._connections_total += 1
 
         logger.debug(
             "Session registered",
@@ -58,7 +80,7 @@ class ConnectionManager:
             },
         )
 
-        return session_id
+        return session
 
     def disconnect(self, session_id: str) -> None:
         """Remove a connection from tracking."""
@@ -78,8 +100,12 @@ class ConnectionManager:
 
     def update_metadata(self, session_id: str, metadata: dict[str, Any]) -> None:
         """Update metadata for a session (e.g., Twilio streamSid, callSid)."""
-        if session_id in self._sessions:
-            self._sessions[session_id].metadata.update(metadata)
+        session = self._sessions.get(session_id)
+        if session:
+            if session.metadata is None:
+                session.metadata = dict(metadata)
+            else:
+                session.metadata.update(metadata)
 
     def active_count(self) -> int:
         """Return the number of active connections."""
@@ -101,30 +127,94 @@ class ConnectionManager:
         """Return all active sessions."""
         return list(self._sessions.values())
 
-    async def close_all(self) -> int:
+    def get_pool_metrics(self) -> dict[str, int]:
+        """Return session registration and eviction counters."""
+        return {
+            "active_sessions": len(self._sessions),
+            "connections_total": self._connections_total,
+            "evictions": self._evictions,
+        }
+
+    async def close_all(self, reason: str = "server_shutdown") -> int:
         """Close all active WebSocket connections. Returns count of closed connections."""
+        sessions = list(self._sessions.values())
+        return await self._close_sessions(sessions, self.SHUTDOWN_CODE, reason)
+
+    async def evict_idle(self, max_idle: float) -> int:
+        """Close sessions with no activity for max_idle seconds. Returns count evicted."""
+        cutoff = time.monotonic() - max_idle
+        idle = [s for s in self._sessions.values() if s.last_active < cutoff]
+        if not idle:
+            return 0
+
+        self._evictions += len(idle)
+        logger.info(
+            "Evicting idle sessions",
+            extra={"idle_sessions": len(idle), "max_idle": max_idle},
+        )
+        await self._close_sessions(idle, self.IDLE_CODE, "idle_timeout")
+        return len(idle)
+
+    async def cleanup_idle_sessions(self, max_idle: float) -> None:
+        """Evict idle sessions every max_idle / 2 seconds until cancelled."""
+        while True:
+            await asyncio.sleep(max_idle / 2)
+            try:
+                await self.evict_idle(max_idle)
+            except Exception as e:
+                logger.error(
+                    "Idle session cleanup failed",
+                    exc_info=True,
+                    extra={"error_type": type(e).__name__},
+                )
+
+    async def _close_sessions(
+        self, sessions: list[Session], code: int, reason: str
+    ) -> int:
+        """Close and untrack the given sessions. Returns count of closed connections."""
+        semaphore = asyncio.Semaphore(CLOSE_CONCURRENCY)
+
+        # Errors are returned rather than raised so a single failing socket
+        # does not abort closing the rest
+        results = await asyncio.gather(
+            *(
+                self._close_one(session, code, reason, semaphore)
+                for session in sessions
+            ),
+            return_exceptions=True,
+        )
+
         closed_count = 0
-        session_ids = list(self._sessions.keys())
-
-        for session_id in session_ids:
-            session = self._sessions.get(session_id)
-            if session:
-                try:
-                    await session.websocket.close()
-                    closed_count += 1
-                except Exception as e:
-                    logger.warning(
-                        "Error closing WebSocket",
-                        extra={
-                            "session_id": session_id,
-                            "error": str(e),
-                        },
-                    )
-                finally:
-                    self.disconnect(session_id)
+        for session, result in zip(sessions, results):
+            self._sessions.pop(session.session_id, None)
+            if isinstance(result, BaseException):
+                logger.warning(
+                    "Error closing WebSocket",
+                    extra={
+                        "session_id": session.session_id,
+                        "error": str(result),
+                    },
+                )
+            else:
+                closed_count += 1
+
+        logger.debug(
+            "Sessions removed",
+            extra={
+                "removed_sessions": len(sessions),
+                "active_sessions": len(self._sessions),
+            },
+        )
 
         return closed_count
 
+    async def _close_one(
+        self, session: Session, code: int, reason: str, semaphore: asyncio.Semaphore
+    ) -> None:
+        """Close a single session's WebSocket, bounded by the shared semaphore."""
+        async with semaphore:
+            await session.websocket.close(code=code, reason=reason)
+
 
 # Singleton instance for use across the application
 connection_manager = ConnectionManager()
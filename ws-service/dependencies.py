@@ -1,19 +1,50 @@
 """Dependency injection helper functions"""
 
 import logging
+from functools import lru_cache
 
-from fastapi import Depends, WebSocket, WebSocketDisconnect
+import httpx
+from fastapi import Depends, WebSocket, WebSocketDisconnect, WebSocketException, status
+from fastapi.requests import HTTPConnection
 from twilio.request_validator import RequestValidator
 
 from config import settings
+from connection_manager import connection_manager
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1)
 def get_twilio_validator() -> RequestValidator:
+    """Return the process-wide Twilio request validator."""
     return RequestValidator(settings.twilio_auth_token)
 
 
+def get_http_client(connection: HTTPConnection) -> httpx.AsyncClient:
+    """Return the shared outbound HTTP client created in the app lifespan."""
+    return connection.app.state.http
+
+
+async def reject_if_shutting_down(websocket: WebSocket) -> None:
+    """Dependency that rejects new websocket connections during graceful shutdown
+
+    Declared as a route-level dependency so it runs before any other dependency
+    and before the handshake is accepted, keeping new sessions out of the
+    connection manager while existing ones are being closed.
+    """
+    if connection_manager.is_shutting_down():
+        logger.info(
+            "Rejecting WebSocket connection - server is shutting down",
+            extra={
+                "client_host": websocket.client.host if websocket.client else "unknown",
+                "client_port": websocket.client.port if websocket.client else 0,
+            },
+        )
+        raise WebSocketException(
+            code=status.WS_1013_TRY_AGAIN_LATER, reason="Server is shutting down"
+        )
+
+
 async def validate_twilio_websocket(
     websocket: WebSocket,
     validator: RequestValidator = Depends(get_twilio_validator),
@@ -36,12 +67,15 @@ async def validate_twilio_websocket(
     signature = headers.get("X-Twilio-Signature", None)
 
     if not signature:
-        logger.error(
-            "Twilio WebSocket signature missing from headers",
-            extra={
-                "headers": dict(headers),
-            },
-        )
+        # Log header names only: avoids copying values (which may carry
+        # credentials) on a path any unauthenticated client can trigger
+        if logger.isEnabledFor(logging.ERROR):
+            logger.error(
+                "Twilio WebSocket signature missing from headers",
+                extra={
+                    "header_names": list(headers.keys()),
+                },
+            )
         raise WebSocketDisconnect(code=1008)
 
     # Twilio expects the full URL used in the request *without* the signature param
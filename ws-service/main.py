@@ -1,28 +1,84 @@
 """WebSocket service with proper logging and configuration."""
 
+import asyncio
+import atexit
 import json
 import logging
+import queue
 import sys
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from datetime import datetime, timezone
+from itertools import islice
+from logging.handlers import QueueHandler, QueueListener
 
+import httpx
+import orjson
+import uvicorn
 from fastapi import FastAPI
 
 from config import settings
 from connection_manager import connection_manager
 from routes import api_router, websocket_router
 
+# Standard LogRecord attributes excluded from JSON "extra" fields
+_RESERVED_RECORD_ATTRS = frozenset(
+    {
+        "name",
+        "msg",
+        "args",
+        "created",
+        "filename",
+        "funcName",
+        "levelname",
+        "levelno",
+        "lineno",
+        "module",
+        "msecs",
+        "message",
+        "pathname",
+        "process",
+        "processName",
+        "relativeCreated",
+        "thread",
+        "threadName",
+        "taskName",
+        "exc_info",
+        "exc_text",
+        "stack_info",
+    }
+)
+
+
+# Set once setup_logging() has installed the root handler
+_logging_initialized = False
+
+
+class _LocalQueueHandler(QueueHandler):
+    """Enqueue records untouched so formatting runs on the listener thread."""
+
+    def prepare(self, record):
+        return record
+
 
 # Configure logging based on settings
 def setup_logging():
     """Configure logging with appropriate format and level."""
+    global _logging_initialized
+    if _logging_initialized:
+        return
+    _logging_initialized = True
 
     if settings.log_format == "json":
+        # LogRecord.__init__ sets every standard attribute before makeRecord()
+        # copies in ``extra`` fields, so extras always start after this many
+        # keys of a record's __dict__ for the active record factory
+        base_attr_count = len(logging.makeLogRecord({}).__dict__)
+
         # JSON formatter for structured logging
         class JsonFormatter(logging.Formatter):
             def format(self, record):
                 log_data = {
-                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "timestamp": datetime.fromtimestamp(record.created, timezone.utc),
                     "level": record.levelname,
                     "logger": record.name,
                     "message": record.getMessage(),
@@ -34,34 +90,25 @@ def setup_logging():
                 if record.exc_info:
                     log_data["exception"] = self.formatException(record.exc_info)
 
-                # Add any extra fields
-                for key, value in record.__dict__.items():
-                    if key not in [
-                        "name",
-                        "msg",
-                        "args",
-                        "created",
-                        "filename",
-                        "funcName",
-                        "levelname",
-                        "levelno",
-                        "lineno",
-                        "module",
-                        "msecs",
-                        "message",
-                        "pathname",
-                        "process",
-                        "processName",
-                        "relativeCreated",
-                        "thread",
-                        "threadName",
-                        "exc_info",
-                        "exc_text",
-                        "stack_info",
-                    ]:
+                # Add any extra fields, skipping the standard attributes
+                # up front; the reserved-name check still catches ones set
+                # after construction (e.g. "message" by other formatters)
+                extras = islice(record.__dict__.items(), base_attr_count, None)
+                for key, value in extras:
+                    if key not in _RESERVED_RECORD_ATTRS:
                         log_data[key] = value
 
-                return json.dumps(log_data)
+                # orjson serializes datetimes natively; fall back to str() for
+                # any extra values it does not know how to encode
+                try:
+                    return orjson.dumps(
+                        log_data, default=str, option=orjson.OPT_NON_STR_KEYS
+                    ).decode()
+                except orjson.JSONEncodeError:
+                    # e.g. ints wider than 64 bits, which default= never sees;
+                    # the stdlib encoder still writes the record
+                    log_data["timestamp"] = log_data["timestamp"].isoformat()
+                    return json.dumps(log_data, default=str, separators=(",", ":"))
 
         formatter = JsonFormatter()
     else:
@@ -79,11 +126,18 @@ def setup_logging():
     for handler in root_logger.handlers[:]:
         root_logger.removeHandler(handler)
 
-    # Add console handler
+    # Console handler runs on a QueueListener thread so formatting and stdout
+    # writes never block the event loop; the root logger only enqueues
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(settings.log_level_int)
     console_handler.setFormatter(formatter)
-    root_logger.addHandler(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root_logger.addHandler(_LocalQueueHandler(log_queue))
+    listener = QueueListener(log_queue, console_handler, respect_handler_level=True)
+    listener.start()
+    # Flush anything still queued when the interpreter exits
+    atexit.register(listener.stop)
 
     # Set FastAPI and uvicorn loggers to use the same level
     logging.getLogger("fastapi").setLevel(settings.log_level_int)
@@ -111,7 +165,24 @@ async def lifespan(app: FastAPI):
             "log_format": settings.log_format,
         },
     )
+
+    # Shared outbound HTTP client so handlers reuse pooled keep-alive connections
+    app.state.http = httpx.AsyncClient()
+
+    # Periodically evict sessions whose clients stopped sending
+    cleanup_task = None
+    if settings.session_pool_max_idle > 0:
+        cleanup_task = asyncio.create_task(
+            connection_manager.cleanup_idle_sessions(settings.session_pool_max_idle)
+        )
+
     yield
+
+    if cleanup_task is not None:
+        cleanup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await cleanup_task
+
     # Signal shutdown to reject new connections
     logger.info("Initiating graceful shutdown - setting shutdown flag")
     connection_manager.begin_shutdown()
@@ -128,8 +199,13 @@ async def lifespan(app: FastAPI):
             "WebSocket connections closed", extra={"closed_count": closed_count}
         )
 
+    await app.state.http.aclose()
+
     # Log application shutdown
-    logger.info("Application shutting down")
+    logger.info(
+        "Application shutting down",
+        extra={"session_pool": connection_manager.get_pool_metrics()},
+    )
 
 
 # Create FastAPI app
@@ -146,7 +222,19 @@ app.include_router(websocket_router)
 
 def main():
     """Main entry point for the application."""
-    logger.info(f"Hello from {settings.app_name}!")
+    # Same server stack as the Dockerfile: uvloop event loop, httptools HTTP
+    # parser and the websockets protocol implementation. permessage-deflate is
+    # off because base64 audio frames do not compress and uvicorn has no
+    # per-route setting for it
+    uvicorn.run(
+        app,
+        host=settings.host,
+        port=settings.port,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
+    )
 
 
 if __name__ == "__main__":
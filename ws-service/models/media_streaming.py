@@ -1,6 +1,7 @@
+import binascii
 from typing import Annotated, Any, Dict, Literal, Union
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class MediaFormat(BaseModel):
@@ -20,16 +21,16 @@ class StartDetails(BaseModel):
 
 class MediaDetails(BaseModel):
     track: Literal["inbound", "outbound"]
+    # Twilio sends chunk/timestamp as numeric strings; pydantic's lax mode
+    # coerces them to int inside pydantic-core without a Python validator
     chunk: int
     timestamp: int
     payload: str
 
-    @field_validator("chunk", "timestamp", mode="before")
-    @classmethod
-    def convert_str_to_int(cls, v):
-        if isinstance(v, str):
-            return int(v)
-        return v
+    def decode_payload(self) -> bytes:
+        """Decode the base64 payload into raw mu-law audio bytes."""
+        # base64.b64decode is a Python-level wrapper around this same call
+        return binascii.a2b_base64(self.payload)
 
 
 class StopDetails(BaseModel):
@@ -69,5 +70,9 @@ class StopMessage(BaseMessage):
 Message = Union[ConnectedMessage, StartMessage, MediaMessage, StopMessage]
 
 StreamMessage = Annotated[
-    Union[StartMessage, MediaMessage, StopMessage], Field(discriminator="event")
+    Union[ConnectedMessage, StartMessage, MediaMessage, StopMessage],
+    Field(discriminator="event"),
 ]
+
+# Compiled once at import; reuse it rather than building a TypeAdapter per frame
+stream_message_adapter = TypeAdapter(StreamMessage)
@@ -1,134 +1,353 @@
 """WebSocket routes."""
 
+import asyncio
 import logging
+from dataclasses import dataclass
+from types import MappingProxyType
 
 from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi.datastructures import QueryParams
 from pydantic import ValidationError
 from twilio.twiml.voice_response import VoiceResponse
 
 from connection_manager import connection_manager
-from dependencies import validate_twilio_websocket
-from models.media_streaming import Message
+from dependencies import reject_if_shutting_down, validate_twilio_websocket
+from models.media_streaming import (
+    ConnectedMessage,
+    MediaMessage,
+    StartMessage,
+    StopMessage,
+    stream_message_adapter,
+)
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Request headers copied into the session and connection log
+_HEADER_KEYS = ("user-agent", "origin", "x-forwarded-for", "x-real-ip")
+
+# Echo responses are newline-delimited, one prefixed line per received message
+_ECHO_PREFIX = "Message text was: "
+_ECHO_SEPARATOR = "\n" + _ECHO_PREFIX
+
+# Received echo messages buffered while a response is being sent; a full queue
+# stops reading from the client until the sender catches up
+_ECHO_QUEUE_SIZE = 256
+# Upper bounds on a single coalesced echo response
+_ECHO_BATCH_MAX_MESSAGES = 64
+_ECHO_BATCH_MAX_CHARS = 64 * 1024
+
 
 def extract_connection_metadata(
     websocket: WebSocket,
-) -> tuple[str, int, dict[str, str], dict[str, str]]:
+) -> tuple[str, int, dict[str, str], QueryParams]:
     """Extract client metadata from WebSocket connection."""
     client_host = websocket.client.host if websocket.client else "unknown"
     client_port = websocket.client.port if websocket.client else 0
 
     # Extract relevant headers
-    headers = {}
-    for key in ["user-agent", "origin", "x-forwarded-for", "x-real-ip"]:
-        value = websocket.headers.get(key)
-        if value:
-            headers[key] = value
+    get_header = websocket.headers.get
+    headers = {key: value for key in _HEADER_KEYS if (value := get_header(key))}
 
-    # Extract query parameters
-    query_params = dict(websocket.query_params)
+    # Query parameters are passed through as Starlette's immutable view
+    query_params = websocket.query_params
 
     return client_host, client_port, headers, query_params
 
 
-@router.websocket("/ws/test")
+def _session_logger(
+    session_id: str, client_host: str, client_port: int
+) -> logging.LoggerAdapter:
+    """Return a logger that adds the connection's identity to every record."""
+    # One read-only mapping per connection; calls without their own extra=
+    # pass it to the record as-is instead of copying it
+    base_extra = MappingProxyType(
+        {
+            "session_id": session_id,
+            "client_host": client_host,
+            "client_port": client_port,
+        }
+    )
+    return logging.LoggerAdapter(logger, base_extra, merge_extra=True)
+
+
+@router.websocket("/ws/test", dependencies=[Depends(reject_if_shutting_down)])
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket test endpoint."""
     client_host, client_port, headers, query_params = extract_connection_metadata(
         websocket
     )
 
-    # Reject connections during shutdown
-    if connection_manager.is_shutting_down():
-        logger.info(
-            "Rejecting WebSocket connection - server is shutting down",
-            extra={"client_host": client_host, "client_port": client_port},
-        )
-        await websocket.close(code=1001, reason="Server is shutting down")
-        return
-
     await websocket.accept()
 
+    # Manager methods used for bookkeeping, bound once per connection
+    active_count = connection_manager.active_count
+    disconnect = connection_manager.disconnect
+
     # Register session
-    session_id = connection_manager.connect(
+    session = connection_manager.connect(
         websocket=websocket,
         client_host=client_host,
         client_port=client_port,
         headers=headers,
         query_params=query_params,
     )
+    session_id = session.session_id
+
+    # Per-connection logger carrying the fields every record below shares
+    log = _session_logger(session_id, client_host, client_port)
+    # Resolved once per connection rather than on every frame
+    debug_on = log.isEnabledFor(logging.DEBUG)
 
-    logger.info(
+    log.info(
         "WebSocket connection established",
         extra={
-            "session_id": session_id,
-            "client_host": client_host,
-            "client_port": client_port,
             "headers": headers,
-            "query_params": query_params,
-            "active_sessions": connection_manager.active_count(),
+            # Copied so JSON logs get an object, not str(QueryParams)
+            "query_params": dict(query_params),
+            "active_sessions": active_count(),
         },
     )
 
+    # Bind per-frame callables once rather than resolving them every message
+    send_text = websocket.send_text
+
+    # Frames are read on a separate task so that messages arriving while a
+    # response is being sent queue up and go out together in one frame
+    pending: asyncio.Queue[str | None] = asyncio.Queue(maxsize=_ECHO_QUEUE_SIZE)
+
+    async def read_frames() -> None:
+        try:
+            # iter_text() returns once the client disconnects
+            async for data in websocket.iter_text():
+                session.touch()
+                if debug_on:
+                    log.debug(
+                        "Received WebSocket message",
+                        extra={
+                            "message_length": len(data),
+                        },
+                    )
+                await pending.put(data)
+        except Exception:
+            # Wake the sender, which re-raises this via ``await reader``
+            await pending.put(None)
+            raise
+        # None marks the end of the stream for the sender loop
+        await pending.put(None)
+
+    reader = asyncio.create_task(read_frames())
+
     try:
-        while True:
-            data = await websocket.receive_text()
-            logger.debug(
-                "Received WebSocket message",
-                extra={
-                    "session_id": session_id,
-                    "client_host": client_host,
-                    "message_length": len(data),
-                },
-            )
-
-            response = f"Message text was: {data}"
-            await websocket.send_text(response)
-
-            logger.debug(
-                "Sent WebSocket response",
-                extra={
-                    "session_id": session_id,
-                    "client_host": client_host,
-                    "response_length": len(response),
-                },
-            )
+        while (data := await pending.get()) is not None:
+            batch = [data]
+            batch_chars = len(data)
+            while (
+                not pending.empty()
+                and len(batch) < _ECHO_BATCH_MAX_MESSAGES
+                and batch_chars < _ECHO_BATCH_MAX_CHARS
+            ):
+                data = pending.get_nowait()
+                if data is None:
+                    # Put the end marker back so the outer loop sees it next
+                    pending.put_nowait(None)
+                    break
+                batch.append(data)
+                batch_chars += len(data)
+
+            # Joining on the separator prefixes every message in a single pass
+            response = _ECHO_PREFIX + _ECHO_SEPARATOR.join(batch)
+            await send_text(response)
+
+            if debug_on:
+                log.debug(
+                    "Sent WebSocket response",
+                    extra={
+                        "batch_size": len(batch),
+                        "response_length": len(response),
+                    },
+                )
+
+        # Surface any error raised while reading
+        await reader
+        log.info("WebSocket client disconnected")
     except WebSocketDisconnect:
-        logger.info(
-            "WebSocket client disconnected",
-            extra={
-                "session_id": session_id,
-                "client_host": client_host,
-                "client_port": client_port,
-            },
-        )
+        # Raised by send_text() if the client goes away mid-response
+        log.info("WebSocket client disconnected while sending")
     except Exception as e:
-        logger.error(
+        log.error(
             "WebSocket error occurred",
             exc_info=True,
             extra={
-                "session_id": session_id,
-                "client_host": client_host,
                 "error_type": type(e).__name__,
             },
         )
     finally:
+        reader.cancel()
         # Cleanup: remove session from tracking
-        connection_manager.disconnect(session_id)
-        logger.debug(
+        disconnect(session_id)
+        log.debug(
             "Session cleaned up",
             extra={
-                "session_id": session_id,
-                "active_sessions": connection_manager.active_count(),
+                "active_sessions": active_count(),
             },
         )
 
 
-@router.websocket("/ws/media")
+@dataclass(slots=True)
+class _MediaStreamState:
+    """Per-connection state shared by the Twilio media event handlers."""
+
+    session_id: str
+    log: logging.LoggerAdapter
+    # Cached log.isEnabledFor() results for the life of the connection
+    info_on: bool
+    debug_on: bool
+    has_seen_media: bool = False
+
+
+# Twilio serializes "event" as the first key, so steady-state media frames can
+# be recognized by prefix without parsing them
+_MEDIA_EVENT_TEXT = '{"event":"media"'
+_MEDIA_EVENT_BYTES = _MEDIA_EVENT_TEXT.encode()
+
+# Maximum characters (or bytes) of an invalid frame included in its warning
+_RAW_PREVIEW_LIMIT = 256
+
+# Frames buffered between the media reader task and the validating consumer
+_MEDIA_QUEUE_SIZE = 256
+
+
+# Event handlers return True when the stream should stop being read
+
+
+def _on_connected(stream: _MediaStreamState, message: ConnectedMessage) -> bool:
+    if stream.info_on:
+        stream.log.info(
+            "Connected Message received",
+            extra={"twilio_message": message.model_dump()},
+        )
+    return False
+
+
+def _on_start(stream: _MediaStreamState, message: StartMessage) -> bool:
+    # Extract Twilio metadata from start message; a literal over the already
+    # validated attributes is the cheapest way to build this dict
+    start = message.start
+    twilio_metadata = {
+        "stream_sid": start.streamSid,
+        "call_sid": start.callSid,
+        "account_sid": start.accountSid,
+    }
+    connection_manager.update_metadata(stream.session_id, twilio_metadata)
+    if stream.info_on:
+        stream.log.info(
+            "Start Message received",
+            extra={"twilio_message": message.model_dump(), **twilio_metadata},
+        )
+    return False
+
+
+def _on_media(stream: _MediaStreamState, message: MediaMessage) -> bool:
+    # Only reached for the first media frame; receive_media skips the rest
+    stream.has_seen_media = True
+    if stream.info_on:
+        stream.log.info(
+            "Media message",
+            extra={"twilio_message": message.model_dump()},
+        )
+        stream.log.info(
+            "Additional media messages from WebSocket are being suppressed...."
+        )
+    return False
+
+
+def _on_stop(stream: _MediaStreamState, message: StopMessage) -> bool:
+    if stream.info_on:
+        stream.log.info(
+            "Stop Message received",
+            extra={"twilio_message": message.model_dump()},
+        )
+    return True
+
+
+# Keyed on the validated model class, which the "event" discriminator already
+# selected, so dispatch needs no string compare; the adapter only yields these
+_MEDIA_HANDLERS = {
+    ConnectedMessage: _on_connected,
+    StartMessage: _on_start,
+    MediaMessage: _on_media,
+    StopMessage: _on_stop,
+}
+
+
+async def _media_loop(
+    stream: _MediaStreamState,
+    frames: asyncio.Queue[str | bytes | None],
+    reader: asyncio.Task[None],
+) -> int:
+    """Dispatch queued frames until a stop event and return the message count."""
+    # No connection-level try/except here: disconnects and reader errors
+    # propagate to receive_media, which handles them once
+    log = stream.log
+    validate_json = stream_message_adapter.validate_json
+
+    message_count = 0
+
+    while (raw := await frames.get()) is not None:
+        # Once the first media frame has been logged the rest are only
+        # counted, so skip parsing their base64 payloads altogether
+        if stream.has_seen_media and raw.startswith(
+            _MEDIA_EVENT_TEXT if type(raw) is str else _MEDIA_EVENT_BYTES
+        ):
+            message_count += 1
+            continue
+
+        # Parse and validate the frame against the discriminated union in
+        # a single pass; pydantic dispatches on "event" internally
+        try:
+            message = validate_json(raw)
+        except ValidationError as e:
+            # Only a bounded preview is logged so oversized or flooding
+            # frames do not bloat log records and the log queue
+            preview = raw[:_RAW_PREVIEW_LIMIT]
+            if isinstance(preview, bytes):
+                preview = preview.decode("utf-8", errors="replace")
+            extra = {
+                "error_count": e.error_count(),
+                "raw_message": preview,
+                "raw_length": len(raw),
+            }
+            # Serializing the full error tree is costly when a client
+            # floods bad frames; only pay for it when debugging. The input
+            # is left out since raw_message already carries it, and binary
+            # frames need not be valid UTF-8
+            if stream.debug_on:
+                extra["error"] = e.json(include_url=False, include_input=False)
+            log.warning("Invalid message format, dropping", extra=extra)
+            continue
+
+        message_type = type(message)
+
+        # Media frames serialized differently from Twilio's usual key
+        # order miss the prefix check above but are still only counted
+        if stream.has_seen_media and message_type is MediaMessage:
+            message_count += 1
+            continue
+
+        if _MEDIA_HANDLERS[message_type](stream, message):
+            break
+
+        message_count += 1
+    else:
+        # Surface the disconnect or error that ended the reader
+        await reader
+
+    return message_count
+
+
+@router.websocket("/ws/media", dependencies=[Depends(reject_if_shutting_down)])
 async def receive_media(
     websocket: WebSocket, _validated: None = Depends(validate_twilio_websocket)
 ):
@@ -137,137 +356,103 @@ async def receive_media(
         websocket
     )
 
-    # Reject connections during shutdown
-    if connection_manager.is_shutting_down():
-        logger.info(
-            "Rejecting WebSocket connection - server is shutting down",
-            extra={"client_host": client_host, "client_port": client_port},
-        )
-        await websocket.close(code=1001, reason="Server is shutting down")
-        return
-
     await websocket.accept()
 
+    # Manager methods used for bookkeeping, bound once per connection
+    active_count = connection_manager.active_count
+    disconnect = connection_manager.disconnect
+
     # Register session
-    session_id = connection_manager.connect(
+    session = connection_manager.connect(
         websocket=websocket,
         client_host=client_host,
         client_port=client_port,
         headers=headers,
         query_params=query_params,
     )
+    session_id = session.session_id
+
+    # Per-connection logger carrying the fields every record below shares
+    log = _session_logger(session_id, client_host, client_port)
 
-    logger.info(
+    log.info(
         "WebSocket connection established",
         extra={
-            "session_id": session_id,
-            "client_host": client_host,
-            "client_port": client_port,
             "headers": headers,
-            "query_params": query_params,
-            "active_sessions": connection_manager.active_count(),
+            # Copied so JSON logs get an object, not str(QueryParams)
+            "query_params": dict(query_params),
+            "active_sessions": active_count(),
         },
     )
 
-    try:
-        message_count = 0
-        has_seen_media = False
-
-        while True:
-            media = await websocket.receive_json()
-
-            # Validate message against defined types
-            try:
-                message = Message.model_validate(media)
-            except ValidationError as e:
-                logger.warning(
-                    "Invalid message format, dropping",
-                    extra={
-                        "session_id": session_id,
-                        "client_host": client_host,
-                        "error": str(e),
-                        "raw_message": media,
-                    },
-                )
-                continue
+    # Bind per-frame callables once rather than resolving them every message
+    receive = websocket.receive
 
-            if message.event == "connected":
-                logger.info(
-                    "Connected Message received",
-                    extra={"session_id": session_id, "message": media},
-                )
-            elif message.event == "start":
-                # Extract Twilio metadata from start message
-                start_data = media.get("start", {})
-                twilio_metadata = {
-                    "stream_sid": start_data.get("streamSid"),
-                    "call_sid": start_data.get("callSid"),
-                    "account_sid": start_data.get("accountSid"),
-                }
-                connection_manager.update_metadata(session_id, twilio_metadata)
-                logger.info(
-                    "Start Message received",
-                    extra={
-                        "session_id": session_id,
-                        "message": media,
-                        **twilio_metadata,
-                    },
-                )
-            elif message.event == "media":
-                if not has_seen_media:
-                    logger.info(
-                        "Media message",
-                        extra={"session_id": session_id, "message": media},
-                    )
-                    logger.info(
-                        "Additional media messages from WebSocket are being suppressed...."
+    stream = _MediaStreamState(
+        session_id=session_id,
+        log=log,
+        info_on=log.isEnabledFor(logging.INFO),
+        debug_on=log.isEnabledFor(logging.DEBUG),
+    )
+
+    # Frames are received on a separate task so the socket keeps being read
+    # while earlier frames are validated; the bounded queue applies
+    # backpressure if processing falls behind
+    frames: asyncio.Queue[str | bytes | None] = asyncio.Queue(maxsize=_MEDIA_QUEUE_SIZE)
+
+    async def read_frames() -> None:
+        try:
+            while True:
+                # Read the raw ASGI message so text and binary frames both go
+                # straight to the JSON validator without an extra decode
+                frame = await receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(
+                        frame.get("code", 1000), frame.get("reason")
                     )
-                    has_seen_media = True
-            elif message.event == "stop":
-                logger.info(
-                    "Stop Message received",
-                    extra={"session_id": session_id, "message": media},
-                )
-                break
+                raw = frame.get("text")
+                if raw is None:
+                    raw = frame["bytes"]
+                session.touch()
+                await frames.put(raw)
+        except Exception:
+            # None wakes the consumer, which re-raises this via ``await reader``
+            await frames.put(None)
+            raise
+
+    reader = asyncio.create_task(read_frames())
 
-            message_count += 1
+    try:
+        message_count = await _media_loop(stream, frames, reader)
 
-        logger.info(
+        # Stop reading before closing so the reader does not race the close
+        reader.cancel()
+        log.info(
             "Connection closed",
             extra={
-                "session_id": session_id,
                 "message_count": message_count,
             },
         )
         await websocket.close()
 
     except WebSocketDisconnect:
-        logger.info(
-            "WebSocket client disconnected",
-            extra={
-                "session_id": session_id,
-                "client_host": client_host,
-                "client_port": client_port,
-            },
-        )
+        log.info("WebSocket client disconnected")
     except Exception as e:
-        logger.error(
+        log.error(
             "WebSocket error occurred",
             exc_info=True,
             extra={
-                "session_id": session_id,
-                "client_host": client_host,
                 "error_type": type(e).__name__,
             },
         )
     finally:
+        reader.cancel()
         # Cleanup: remove session from tracking
-        connection_manager.disconnect(session_id)
-        logger.debug(
+        disconnect(session_id)
+        log.debug(
             "Session cleaned up",
             extra={
-                "session_id": session_id,
-                "active_sessions": connection_manager.active_count(),
+                "active_sessions": active_count(),
             },
         )
 